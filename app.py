@@ -1,12 +1,18 @@
-from flask import Flask, render_template, request, redirect, url_for, Response, session
+from flask import Flask, render_template, request, redirect, url_for, Response, session, jsonify
 from src.parser import parse_ris_file, entries_to_df
 from src.analyzer import analyze_references
 from src.comparator import compare_datasets
 from src.deduplicator import deduplicate_multiple_files, get_deduplication_stats
-from src.exporter import export_to_ris_string
+from src.exporter import iter_ris_lines
 from src.search_engine import search_references
+import hashlib
+import multiprocessing
 import os
+import threading
 import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from cachetools import TTLCache
 
 app = Flask(__name__)
 app.secret_key = 'supersecretkey'  # Needed for session or flash messages if used
@@ -38,6 +44,115 @@ if not os.path.exists(UPLOAD_FOLDER):
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
+# Compare results kept in memory so /export_ris can serve any subset without
+# re-parsing or re-comparing; keyed by a hash of the two uploaded files
+COMPARE_RESULTS = TTLCache(maxsize=128, ttl=3600)
+COMPARE_RESULTS_LOCK = threading.Lock()
+
+# Comparisons run in worker processes so large uploads don't block the
+# request thread; pending jobs are tracked by their result key and expire
+# like results, so jobs nobody polls again don't stay in memory
+COMPARE_JOBS = TTLCache(maxsize=128, ttl=3600)
+COMPARE_JOBS_LOCK = threading.Lock()
+
+
+def _new_executor():
+    """
+    Create the comparison process pool.
+    
+    Workers are spawned rather than forked: the pool is started from a
+    request thread, and forking a multi-threaded server is unsafe.
+    """
+    return ProcessPoolExecutor(max_workers=os.cpu_count(),
+                               mp_context=multiprocessing.get_context('spawn'))
+
+
+EXECUTOR = _new_executor()
+
+
+def _content_key(data_a, data_b):
+    """Hash the raw bytes of two uploads into a short cache key."""
+    h = hashlib.blake2b(digest_size=16)
+    for data in (data_a, data_b):
+        h.update(len(data).to_bytes(8, 'little'))
+        h.update(data)
+    return h.hexdigest()
+
+
+def _run_compare(data_a, data_b):
+    """
+    Parse and compare two RIS uploads (runs in a worker process).
+    
+    Takes the raw upload bytes so only bytes are pickled on the way in.
+    
+    Returns:
+        (overlap, unique_a, unique_b, total_a, total_b), the first three
+        as DataFrames
+    """
+    df_a = entries_to_df(parse_ris_file(data_a))
+    df_b = entries_to_df(parse_ris_file(data_b))
+    
+    # The pool already uses every core, so fuzzy scoring stays single-threaded
+    overlap, unique_a, unique_b = compare_datasets(df_a, df_b, workers=1)
+    return overlap, unique_a, unique_b, len(df_a), len(df_b)
+
+
+def _submit_compare(data_a, data_b):
+    """
+    Submit a comparison to the pool (call with COMPARE_JOBS_LOCK held).
+    
+    A worker that crashed (e.g. killed for running out of memory) breaks
+    the whole pool, so it is replaced instead of failing every later job.
+    """
+    global EXECUTOR
+    try:
+        return EXECUTOR.submit(_run_compare, data_a, data_b)
+    except BrokenProcessPool:
+        EXECUTOR = _new_executor()
+        return EXECUTOR.submit(_run_compare, data_a, data_b)
+
+
+def _collect_compare_job(job_id):
+    """
+    Move a finished comparison from COMPARE_JOBS into COMPARE_RESULTS.
+    
+    Returns:
+        'done', 'running', 'error' or None if the job id is unknown
+    """
+    with COMPARE_RESULTS_LOCK:
+        if job_id in COMPARE_RESULTS:
+            return 'done'
+    
+    with COMPARE_JOBS_LOCK:
+        job = COMPARE_JOBS.get(job_id)
+        if job is None:
+            return None
+        if not job['future'].done():
+            return 'running'
+    
+    # The job is only dropped once its result is stored, so a concurrent
+    # poll always finds one of the two (storing it twice is harmless)
+    try:
+        overlap, unique_a, unique_b, total_a, total_b = job['future'].result()
+    except Exception as e:
+        print(f"Error comparing files: {e}")
+        status = 'error'
+    else:
+        with COMPARE_RESULTS_LOCK:
+            COMPARE_RESULTS[job_id] = {
+                'overlap': overlap,
+                'unique_a': unique_a,
+                'unique_b': unique_b,
+                'total_a': total_a,
+                'total_b': total_b
+            }
+        status = 'done'
+    
+    with COMPARE_JOBS_LOCK:
+        COMPARE_JOBS.pop(job_id, None)
+    return status
+
+
 @app.route('/compare', methods=['POST'])
 def compare():
     if 'file_a' not in request.files or 'file_b' not in request.files:
@@ -49,90 +164,113 @@ def compare():
     if file_a.filename == '' or file_b.filename == '':
         return redirect(url_for('index'))
 
-    # Save files for export functionality
-    path_a = os.path.join(app.config['UPLOAD_FOLDER'], file_a.filename)
-    path_b = os.path.join(app.config['UPLOAD_FOLDER'], file_b.filename)
+    data_a = file_a.stream.read()
+    data_b = file_b.stream.read()
     
-    file_a.save(path_a)
-    file_b.save(path_b)
+    # Identical uploads share one job and one cached result; the file names
+    # belong to this request and travel in the URLs instead
+    job_id = _content_key(data_a, data_b)
     
-    # Read back for parsing
-    with open(path_a, 'r', encoding='utf-8', errors='ignore') as f:
-        entries_a = parse_ris_file(f.read())
-        
-    with open(path_b, 'r', encoding='utf-8', errors='ignore') as f:
-        entries_b = parse_ris_file(f.read())
+    with COMPARE_RESULTS_LOCK:
+        cached = job_id in COMPARE_RESULTS
+    if cached:
+        return redirect(url_for('compare_result', job_id=job_id,
+                                filename_a=file_a.filename, filename_b=file_b.filename))
+    
+    with COMPARE_JOBS_LOCK:
+        if job_id not in COMPARE_JOBS:
+            COMPARE_JOBS[job_id] = {'future': _submit_compare(data_a, data_b)}
+    
+    return render_template('compare_pending.html',
+                           job_id=job_id,
+                           filename_a=file_a.filename,
+                           filename_b=file_b.filename)
+
+
+@app.route('/compare_status/<job_id>')
+def compare_status(job_id):
+    """Report the state of a background comparison as JSON (polled by the client)."""
+    status = _collect_compare_job(job_id)
+    
+    if status is None:
+        return jsonify({'status': 'unknown'}), 404
+    
+    response = {'status': status}
+    if status == 'done':
+        response['url'] = url_for('compare_result', job_id=job_id,
+                                  filename_a=request.args.get('filename_a', 'File A'),
+                                  filename_b=request.args.get('filename_b', 'File B'))
+    return jsonify(response)
+
+
+@app.route('/compare_result/<job_id>')
+def compare_result(job_id):
+    """Render a finished comparison."""
+    if _collect_compare_job(job_id) != 'done':
+        return "Comparison expired or failed. Please re-upload.", 404
     
-    df_a = entries_to_df(entries_a)
-    df_b = entries_to_df(entries_b)
+    with COMPARE_RESULTS_LOCK:
+        results = COMPARE_RESULTS.get(job_id)
     
-    overlap, unique_a, unique_b = compare_datasets(df_a, df_b)
+    if results is None:
+        return "Comparison expired. Please re-upload.", 404
     
     stats = {
-        "overlap_count": len(overlap),
-        "unique_a_count": len(unique_a),
-        "unique_b_count": len(unique_b),
-        "total_a": len(df_a),
-        "total_b": len(df_b)
+        "overlap_count": len(results['overlap']),
+        "unique_a_count": len(results['unique_a']),
+        "unique_b_count": len(results['unique_b']),
+        "total_a": results['total_a'],
+        "total_b": results['total_b']
     }
 
     return render_template('compare.html', 
-                           overlap=overlap, 
-                           unique_a=unique_a, 
-                           unique_b=unique_b, 
+                           overlap=results['overlap'], 
+                           unique_a=results['unique_a'], 
+                           unique_b=results['unique_b'], 
                            stats=stats,
-                           filename_a=file_a.filename,
-                           filename_b=file_b.filename)
+                           filename_a=request.args.get('filename_a', 'File A'),
+                           filename_b=request.args.get('filename_b', 'File B'),
+                           result_key=job_id)
 
 @app.route('/export_ris')
 def export_ris():
-    from src.exporter import export_to_ris_string
-    from flask import Response
-
-    filename_a = request.args.get('filename_a')
-    filename_b = request.args.get('filename_b')
+    result_key = request.args.get('key')
     subset = request.args.get('subset') # 'overlap', 'unique_a', 'unique_b'
     
-    if not filename_a or not filename_b or not subset:
+    if not result_key or not subset:
         return "Missing arguments", 400
-        
-    path_a = os.path.join(app.config['UPLOAD_FOLDER'], filename_a)
-    path_b = os.path.join(app.config['UPLOAD_FOLDER'], filename_b)
     
-    if not os.path.exists(path_a) or not os.path.exists(path_b):
-        return "Files expired or missing. Please re-upload.", 404
-        
-    # Re-process to get the subset
-    with open(path_a, 'r', encoding='utf-8', errors='ignore') as f:
-        entries_a = parse_ris_file(f.read())
-    with open(path_b, 'r', encoding='utf-8', errors='ignore') as f:
-        entries_b = parse_ris_file(f.read())
-        
-    df_a = entries_to_df(entries_a)
-    df_b = entries_to_df(entries_b)
+    with COMPARE_RESULTS_LOCK:
+        results = COMPARE_RESULTS.get(result_key)
     
-    overlap, unique_a, unique_b = compare_datasets(df_a, df_b)
+    if results is None:
+        return "Comparison expired. Please re-upload.", 404
     
-    target_data = []
+    filename_a = request.args.get('filename_a', 'File A')
+    filename_b = request.args.get('filename_b', 'File B')
+    
+    target_data = None
     export_filename = "export.ris"
     
     if subset == 'unique_a':
-        target_data = unique_a
+        target_data = results['unique_a']
         export_filename = f"unique_to_{filename_a}"
     elif subset == 'unique_b':
-        target_data = unique_b
+        target_data = results['unique_b']
         export_filename = f"unique_to_{filename_b}"
     elif subset == 'overlap':
-        target_data = overlap
+        target_data = results['overlap']
         export_filename = f"overlap_{filename_a}_{filename_b}.ris"
+    
+    # Only the requested subset is turned into records
+    records = target_data.to_dict('records') if target_data is not None else []
         
     if not export_filename.endswith('.ris'):
         export_filename += '.ris'
         
-    ris_content = export_to_ris_string(target_data)
-    
+    # Stream the RIS output record by record instead of building one string
     return Response(
-        ris_content,
+        iter_ris_lines(records),
         mimetype="application/x-research-info-systems",
         headers={"Content-Disposition": f"attachment;filename={export_filename}"}
     )
@@ -240,10 +378,8 @@ def export_dedup(table_type):
         clean_ref.pop('all_sources', None)
         clean_data.append(clean_ref)
     
-    ris_content = export_to_ris_string(clean_data)
-    
     return Response(
-        ris_content,
+        iter_ris_lines(clean_data),
         mimetype="application/x-research-info-systems",
         headers={"Content-Disposition": f"attachment;filename={export_filename}"}
     )
@@ -375,25 +511,17 @@ def export_search():
         export_filename = f"unmatched_{search_filename}"
     
     # Clean up search-specific metadata
-    clean_data = []
-    for ref in export_data:
-        clean_ref = ref.copy()
-        clean_ref.pop('title_highlighted', None)
-        clean_ref.pop('ti_highlighted', None)
-        clean_ref.pop('abstract_highlighted', None)
-        clean_ref.pop('ab_highlighted', None)
-        clean_ref.pop('n2_highlighted', None)
-        clean_ref.pop('matched_terms', None)
-        clean_ref.pop('match_count', None)
-        clean_data.append(clean_ref)
+    clean_data = export_data.drop(columns=[
+        'title_highlighted', 'ti_highlighted',
+        'abstract_highlighted', 'ab_highlighted', 'n2_highlighted',
+        'matched_terms', 'match_count'
+    ], errors='ignore').to_dict('records')
     
     if not export_filename.endswith('.ris'):
         export_filename += '.ris'
     
-    ris_content = export_to_ris_string(clean_data)
-    
     return Response(
-        ris_content,
+        iter_ris_lines(clean_data),
         mimetype="application/x-research-info-systems",
         headers={"Content-Disposition": f"attachment;filename={export_filename}"}
     )
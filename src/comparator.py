@@ -1,5 +1,17 @@
+import re
+from functools import lru_cache
+
+import jellyfish
+import numpy as np
 import pandas as pd
-from difflib import SequenceMatcher
+from numba import njit
+from rapidfuzz import fuzz, process
+
+
+# Title normalization patterns: one leading article prefix, then every
+# non-alphanumeric character ([\W_] is exactly "not str.isalnum")
+_ARTICLE_PREFIX_RE = re.compile(r'^(?:the|a|an) ')
+_NON_ALNUM_RE = re.compile(r'[\W_]+')
 
 
 def normalize_title_for_key(title):
@@ -10,6 +22,8 @@ def normalize_title_for_key(title):
     - Removes common article prefixes (the, a, an)
     - Removes all non-alphanumeric characters
     - Converts to lowercase
+    - Memoized, since the same titles are normalized for key generation,
+      fuzzy matching and confidence scoring
     
     Args:
         title: Title string to normalize
@@ -20,21 +34,38 @@ def normalize_title_for_key(title):
     if not isinstance(title, str):
         return ""
     
+    return _normalize_title_cached(title)
+
+
+@lru_cache(maxsize=100_000)
+def _normalize_title_cached(title):
+    """Normalize a title string (cached worker for normalize_title_for_key)."""
     # Convert to lowercase and strip whitespace
     title_lower = title.lower().strip()
     
     # Remove common article prefixes (English)
     # This fixes the issue where "The Impact of AI" vs "Impact of AI" wouldn't match
-    article_prefixes = ['the ', 'a ', 'an ']
-    for prefix in article_prefixes:
-        if title_lower.startswith(prefix):
-            title_lower = title_lower[len(prefix):]
-            break
+    title_lower = _ARTICLE_PREFIX_RE.sub('', title_lower)
     
     # Remove all non-alphanumeric characters
-    title_clean = ''.join(c for c in title_lower if c.isalnum())
-    
-    return title_clean
+    return _NON_ALNUM_RE.sub('', title_lower)
+
+
+def _is_present(value):
+    """Scalar not-null check for plain dict values (NaN != NaN)."""
+    return value is not None and value == value
+
+
+def _first_present(row, columns):
+    """
+    Row-wise equivalent of _coalesce_columns: the first of the given fields
+    that is not missing, NaN or an empty string (or None if there is none).
+    """
+    for col in columns:
+        value = row.get(col)
+        if _is_present(value) and not (isinstance(value, str) and value == ''):
+            return value
+    return None
 
 
 def generate_key(row):
@@ -51,25 +82,26 @@ def generate_key(row):
     - Prevents false matches when year is missing
     
     Args:
-        row: Pandas Series representing a reference
+        row: Reference as a plain dict (or a Pandas Series); only .get is used,
+            so callers don't need to wrap records in a Series
         
     Returns:
         Unique key string for matching
     """
     # Priority 1: DOI (most reliable)
-    doi = row.get('doi') or row.get('do')
-    if pd.notna(doi) and str(doi).strip():
+    doi = _first_present(row, ['doi', 'do'])
+    if _is_present(doi) and str(doi).strip():
         return f"DOI:{str(doi).strip().lower()}"
     
     # Priority 2: Title + Year
-    title = row.get('title') or row.get('primary_title') or row.get('ti') or ""
-    year = row.get('year') or row.get('py') or ""
+    title = _first_present(row, ['title', 'primary_title', 'ti'])
+    year = _first_present(row, ['year', 'py'])
     
     # Use improved normalization (removes article prefixes)
     title_norm = normalize_title_for_key(title)
     
     # Validate year exists - prevents false matches for papers without years
-    if pd.notna(year) and str(year).strip():
+    if _is_present(year) and str(year).strip():
         year_str = str(year)[:4]
     else:
         # Use title length as weak discriminator to prevent false matches
@@ -79,74 +111,338 @@ def generate_key(row):
     return f"TY:{title_norm}_{year_str}"
 
 
-def fuzzy_match_pass(unique_a, unique_b, threshold=0.90):
+def _coalesce_columns(df, columns):
+    """
+    Column-wise equivalent of _first_present(row, columns).
+    
+    Missing columns are skipped; NaN/None/empty-string cells fall through
+    to the next column.
+    """
+    result = pd.Series(None, index=df.index, dtype=object)
+    for col in columns:
+        if col in df.columns:
+            missing = result.isna() | result.eq('')
+            result = result.where(~missing, df[col])
+    return result
+
+
+def generate_keys(df, norm_cache=None):
+    """
+    Generate matching keys for every row of a DataFrame.
+    
+    Vectorized version of generate_key: the same DOI / Title+Year waterfall
+    is computed with pandas string operations instead of building a Series
+    per row with df.apply(..., axis=1).
+    
+    Args:
+        df: DataFrame of references
+        norm_cache: Optional dict filled with raw title -> normalized title,
+            so later steps (fuzzy matching) can reuse the normalization
+        
+    Returns:
+        Series of key strings aligned with df.index
+    """
+    # Priority 1: DOI (most reliable)
+    doi = _coalesce_columns(df, ['doi', 'do'])
+    doi_str = doi.astype(str).str.strip()
+    has_doi = doi.notna() & doi_str.ne('')
+    
+    # Priority 2: Title + Year
+    title = _coalesce_columns(df, ['title', 'primary_title', 'ti'])
+    title = title.where(title.map(lambda value: isinstance(value, str)))
+    title_norm = (
+        title.str.lower()
+        .str.strip()
+        .str.replace(_ARTICLE_PREFIX_RE, '', regex=True)
+        .str.replace(_NON_ALNUM_RE, '', regex=True)
+        .fillna('')
+    )
+    if norm_cache is not None:
+        has_title = title.notna()
+        norm_cache.update(zip(title[has_title], title_norm[has_title]))
+    
+    year = _coalesce_columns(df, ['year', 'py'])
+    year_str = year.astype(str)
+    has_year = year.notna() & year_str.str.strip().ne('')
+    year_key = year_str.str[:4].where(has_year, 'NOYEAR_' + title_norm.str.len().astype(str))
+    
+    title_keys = 'TY:' + title_norm + '_' + year_key
+    return title_keys.where(~has_doi, 'DOI:' + doi_str.str.lower())
+
+
+@njit(cache=True)
+def greedy_assign(scores, threshold):
+    """
+    Greedily assign rows to columns of a similarity matrix.
+    
+    Rows are visited in order; each row takes its highest-scoring column
+    that has not been taken yet (first one on ties), provided the score
+    reaches the threshold. Compiled with Numba, since this is a tight
+    numeric loop over the whole matrix.
+    
+    Args:
+        scores: 2-D array of similarity scores (rows = A items, cols = B items)
+        threshold: Minimum score for a row/column pair to be assigned
+        
+    Returns:
+        idx_a: int32 array of assigned row indices
+        idx_b: int32 array of the matching column indices
+    """
+    n_rows, n_cols = scores.shape
+    idx_a = np.empty(min(n_rows, n_cols), dtype=np.int32)
+    idx_b = np.empty(min(n_rows, n_cols), dtype=np.int32)
+    count = 0
+    
+    # Columns not taken yet; a taken column is swapped out of the live prefix
+    # so later rows only scan what is left
+    remaining = np.arange(n_cols)
+    n_remaining = n_cols
+    
+    for i in range(n_rows):
+        if n_remaining == 0:
+            break
+        
+        best_k = -1
+        best_j = -1
+        for k in range(n_remaining):
+            j = remaining[k]
+            if scores[i, j] < threshold:
+                continue
+            # Swapping reorders the columns, so break ties on the column index
+            if (best_k < 0 or scores[i, j] > scores[i, best_j]
+                    or (scores[i, j] == scores[i, best_j] and j < best_j)):
+                best_k = k
+                best_j = j
+        
+        if best_k >= 0:
+            n_remaining -= 1
+            remaining[best_k] = remaining[n_remaining]
+            idx_a[count] = i
+            idx_b[count] = best_j
+            count += 1
+    
+    return idx_a[:count], idx_b[:count]
+
+
+def _has_doi(item):
+    """Check whether a reference would be keyed by its DOI (see generate_key)."""
+    doi = _first_present(item, ['doi', 'do'])
+    return _is_present(doi) and bool(str(doi).strip())
+
+
+def _year_array(items):
+    """
+    Extract publication years as an int16 array.
+    
+    Uses the first 4 characters of the year field; missing or non-numeric
+    years become 0.
+    """
+    years = []
+    for item in items:
+        year = str(_first_present(item, ['year', 'py']) or "")[:4]
+        years.append(int(year) if year.isdecimal() else 0)
+    return np.array(years, dtype=np.int16)
+
+
+def _score_titles(titles_a, titles_b, score_cutoff, workers=-1):
+    """
+    Score every pair of normalized titles in one batched RapidFuzz call.
+    
+    Returns a uint8 matrix (0-100) where pairs below the cutoff score 0;
+    uint8 keeps it 4x smaller than the default float32 and the cutoff is
+    applied before rounding. workers is RapidFuzz's thread count (-1: all
+    cores).
+    """
+    return process.cdist(
+        titles_a,
+        titles_b,
+        scorer=fuzz.ratio,
+        score_cutoff=score_cutoff,
+        workers=workers,
+        dtype=np.uint8
+    )
+
+
+# Fields read by the fuzzy pass (title, year and DOI with their RIS tags)
+_FUZZY_FIELDS = ['title', 'ti', 'year', 'py', 'doi', 'do']
+
+
+def _fuzzy_records(df):
+    """Turn just the _FUZZY_FIELDS columns of a DataFrame into row dicts."""
+    return df[[col for col in _FUZZY_FIELDS if col in df.columns]].to_dict('records')
+
+
+def _phonetic_key(title, length=6):
+    """Metaphone prefix used to block fuzzy candidates ("" for empty titles)."""
+    return jellyfish.metaphone(title)[:length] if title else ""
+
+
+def _match_block(rows, cols, titles_a, titles_b, doi_a, doi_b, score_cutoff, workers=-1):
+    """
+    Score one block of candidates and greedily pair them.
+    
+    Args:
+        rows: Indices into titles_a / doi_a
+        cols: Indices into titles_b / doi_b
+        workers: Threads per RapidFuzz call (see _score_titles)
+        
+    Returns:
+        List of (i, j) index pairs, one per match
+    """
+    if not rows or not cols:
+        return []
+    
+    # Two DOI-keyed items that reached this point have different DOIs and
+    # are different works, so only pairs with a title-keyed side are scored
+    rows_title = [r for r, i in enumerate(rows) if not doi_a[i]]
+    cols_title = [c for c, j in enumerate(cols) if not doi_b[j]]
+    cols_doi = [c for c, j in enumerate(cols) if doi_b[j]]
+    
+    scores = np.zeros((len(rows), len(cols)), dtype=np.uint8)
+    if cols_title:
+        scores[:, cols_title] = _score_titles(
+            [titles_a[i] for i in rows],
+            [titles_b[cols[c]] for c in cols_title],
+            score_cutoff,
+            workers
+        )
+    if rows_title and cols_doi:
+        scores[np.ix_(rows_title, cols_doi)] = _score_titles(
+            [titles_a[rows[r]] for r in rows_title],
+            [titles_b[cols[c]] for c in cols_doi],
+            score_cutoff,
+            workers
+        )
+    
+    # Greedy assignment: each item_a takes its best remaining item_b
+    # (cdist already zeroed every pair below the cutoff)
+    match_rows, match_cols = greedy_assign(scores, 1)
+    return [(rows[r], cols[c]) for r, c in zip(match_rows, match_cols)]
+
+
+def fuzzy_match_pass(unique_a, unique_b, threshold=0.90, norm_cache=None):
     """
     Perform fuzzy matching on previously unmatched items.
     
-    Uses SequenceMatcher to find titles with minor variations (typos, etc.)
-    that should be considered the same reference.
+    Uses RapidFuzz's normalized Indel similarity to find titles with minor
+    variations (typos, etc.) that should be considered the same reference.
     
     Improvements:
     - Activates fuzzy matching (was implemented but not used)
     - Catches typos like "Machine Learning" vs "Machine Learing"
-    - Requires same year to match (prevents false positives)
+    - Requires the same known year to match (prevents false positives)
+    - Never pairs two DOI-keyed items (their DOIs already differ)
+    - Scores titles sharing a metaphone prefix first, then every title
+      still unmatched against the rest of its year
     
     Args:
         unique_a: List of items unique to dataset A
         unique_b: List of items unique to dataset B
         threshold: Similarity threshold (0.0 to 1.0), default 0.90
+        norm_cache: Optional dict of raw title -> normalized title shared with
+            key generation; filled in for titles not seen yet
         
     Returns:
         new_matches: List of (item_a, item_b) tuples that match
         remaining_a: Items from A that still don't match
         remaining_b: Items from B that still don't match
     """
-    new_matches = []
-    matched_a_indices = set()
+    pairs = _fuzzy_match_indices(unique_a, unique_b, threshold, norm_cache)
+    new_matches = [(unique_a[i], unique_b[j]) for i, j in pairs]
+    
+    # Get remaining unmatched items
+    matched_a_indices = {i for i, _ in pairs}
+    matched_b_indices = {j for _, j in pairs}
+    remaining_a = [item for i, item in enumerate(unique_a) if i not in matched_a_indices]
+    remaining_b = [item for j, item in enumerate(unique_b) if j not in matched_b_indices]
+    
+    return new_matches, remaining_a, remaining_b
+
+
+def _fuzzy_match_indices(unique_a, unique_b, threshold=0.90, norm_cache=None, workers=-1):
+    """
+    Core of fuzzy_match_pass, returning positions instead of items.
+    
+    Items only need the title / year / DOI fields (see _FUZZY_FIELDS);
+    workers is the thread count of each RapidFuzz call (see _score_titles).
+    
+    Returns:
+        List of (i, j) pairs: unique_a[i] matches unique_b[j]
+    """
+    score_cutoff = threshold * 100
+    pairs = []
     matched_b_indices = set()
     
-    for i, item_a in enumerate(unique_a):
-        title_a = item_a.get('title') or item_a.get('ti') or ""
-        year_a = item_a.get('year') or item_a.get('py') or ""
+    if norm_cache is None:
+        norm_cache = {}
+    
+    def norm(title):
+        if not isinstance(title, str):
+            return ""
+        if title not in norm_cache:
+            norm_cache[title] = normalize_title_for_key(title)
+        return norm_cache[title]
+    
+    # Normalize every title once instead of once per pair
+    titles_a = [norm(item.get('title') or item.get('ti')) for item in unique_a]
+    titles_b = [norm(item.get('title') or item.get('ti')) for item in unique_b]
+    
+    doi_a = [_has_doi(item) for item in unique_a]
+    doi_b = [_has_doi(item) for item in unique_b]
+    
+    # Metaphone prefix of each title, computed once per item (titles with no
+    # Latin letters get "" and simply block together)
+    phonetic_a = [_phonetic_key(title) for title in titles_a]
+    phonetic_b = [_phonetic_key(title) for title in titles_b]
+    
+    # Years as int16 (0 = missing or unparseable), computed once per item
+    years_a = _year_array(unique_a)
+    years_b = _year_array(unique_b)
+    
+    # Items without a usable title or year can never match: a missing year on
+    # both sides is no evidence that two references are the same work
+    valid_a = years_a > 0
+    valid_a[[i for i, title in enumerate(titles_a) if not title]] = False
+    valid_b = years_b > 0
+    valid_b[[j for j, title in enumerate(titles_b) if not title]] = False
+    
+    # Block by year: year must match - prevents false positives, so only
+    # items in the same year bucket are ever compared
+    for year in np.intersect1d(years_a[valid_a], years_b[valid_b]):
+        rows = np.flatnonzero(valid_a & (years_a == year)).tolist()
+        cols = np.flatnonzero(valid_b & (years_b == year)).tolist()
         
-        if not title_a:
-            continue
+        # Phonetic sub-blocking: first score each item_a only against the
+        # item_b sharing its metaphone prefix (the likely pairs, cheaply)
+        cols_by_key = {}
+        for j in cols:
+            cols_by_key.setdefault(phonetic_b[j], []).append(j)
+        rows_by_key = {}
+        for i in rows:
+            if phonetic_a[i] in cols_by_key:
+                rows_by_key.setdefault(phonetic_a[i], []).append(i)
         
-        title_a_norm = normalize_title_for_key(title_a)
-        
-        for j, item_b in enumerate(unique_b):
-            if j in matched_b_indices:
-                continue
-            
-            title_b = item_b.get('title') or item_b.get('ti') or ""
-            year_b = item_b.get('year') or item_b.get('py') or ""
-            
-            if not title_b:
-                continue
-            
-            # Year must match (or both missing) - prevents false positives
-            if str(year_a)[:4] != str(year_b)[:4]:
-                continue
-            
-            title_b_norm = normalize_title_for_key(title_b)
-            
-            if not title_a_norm or not title_b_norm:
-                continue
-            
-            # Calculate similarity using SequenceMatcher
-            similarity = SequenceMatcher(None, title_a_norm, title_b_norm).ratio()
-            
-            if similarity >= threshold:
-                new_matches.append((item_a, item_b))
+        matched_a_indices = set()
+        blocks = [(key_rows, cols_by_key[key]) for key, key_rows in rows_by_key.items()]
+        for block_rows, block_cols in blocks:
+            for i, j in _match_block(block_rows, block_cols, titles_a, titles_b,
+                                     doi_a, doi_b, score_cutoff, workers):
+                pairs.append((i, j))
                 matched_a_indices.add(i)
                 matched_b_indices.add(j)
-                break  # Move to next item_a
-    
-    # Get remaining unmatched items
-    remaining_a = [item for i, item in enumerate(unique_a) if i not in matched_a_indices]
-    remaining_b = [item for j, item in enumerate(unique_b) if j not in matched_b_indices]
+        
+        # Then every item_a still unmatched (a typo can change the metaphone
+        # prefix) against every item_b of the year still free, so blocking
+        # only prunes work and never loses a match
+        fallback_rows = [i for i in rows if i not in matched_a_indices]
+        if fallback_rows:
+            free_cols = [j for j in cols if j not in matched_b_indices]
+            for i, j in _match_block(fallback_rows, free_cols, titles_a, titles_b,
+                                     doi_a, doi_b, score_cutoff, workers):
+                pairs.append((i, j))
+                matched_b_indices.add(j)
     
-    return new_matches, remaining_a, remaining_b
+    return pairs
 
 
 def calculate_match_confidence(item_a, item_b):
@@ -181,7 +477,7 @@ def calculate_match_confidence(item_a, item_b):
     
     # Fuzzy title match
     if title_a and title_b:
-        similarity = SequenceMatcher(None, title_a, title_b).ratio()
+        similarity = fuzz.ratio(title_a, title_b, score_cutoff=85) / 100.0
         
         if similarity >= 0.95 and year_a == year_b:
             return 0.90, f"High similarity ({similarity:.2f})"
@@ -197,7 +493,7 @@ def robust_title_match(title1, title2):
     """
     Check if two titles are similar enough to be considered the same.
     
-    Uses SequenceMatcher with 90% similarity threshold.
+    Uses RapidFuzz ratio with 90% similarity threshold.
     
     Args:
         title1: First title
@@ -217,10 +513,10 @@ def robust_title_match(title1, title2):
         return True
     
     # Fuzzy match for slight variations
-    return SequenceMatcher(None, t1, t2).ratio() > 0.9
+    return fuzz.ratio(t1, t2) > 90
 
 
-def compare_datasets(df_a, df_b, use_fuzzy=True):
+def compare_datasets(df_a, df_b, use_fuzzy=True, workers=-1):
     """
     Compare two DataFrames of references with improved matching.
     
@@ -232,54 +528,69 @@ def compare_datasets(df_a, df_b, use_fuzzy=True):
     
     Algorithm:
     1. Generate keys using DOI (priority 1) or Title+Year (priority 2)
-    2. Perform set operations to find overlap and unique items
+    2. Hash-join on the keys to find overlap and unique items
     3. Apply fuzzy matching to unmatched items (optional)
-    4. Return results with temp keys cleaned up
+    4. Return the three partitions as DataFrames (no per-row dicts)
     
     Args:
         df_a: DataFrame of references from source A
         df_b: DataFrame of references from source B
         use_fuzzy: Enable fuzzy matching for unmatched items (default: True)
+        workers: Threads used to score fuzzy candidates (default: -1, all
+            cores; use 1 when already running in a pool of processes)
         
     Returns:
-        overlap: List of dicts - references in both A and B
-        unique_a: List of dicts - references only in A
-        unique_b: List of dicts - references only in B
+        overlap: DataFrame - references in both A and B (with a boolean
+            fuzzy_match column)
+        unique_a: DataFrame - references only in A
+        unique_b: DataFrame - references only in B
     """
-    if df_a.empty:
-        return [], [], df_b.to_dict('records')
-    if df_b.empty:
-        return [], df_a.to_dict('records'), []
+    if df_a.empty or df_b.empty:
+        overlap = df_a.iloc[:0].assign(fuzzy_match=pd.Series(dtype=bool))
+        return overlap, df_a.copy(), df_b.copy()
 
     # Step 1: Generate matching keys for all references
-    df_a['temp_key'] = df_a.apply(generate_key, axis=1)
-    df_b['temp_key'] = df_b.apply(generate_key, axis=1)
+    # (title normalizations are kept for reuse by the fuzzy pass)
+    norm_cache = {}
+    df_a['temp_key'] = generate_keys(df_a, norm_cache)
+    df_b['temp_key'] = generate_keys(df_b, norm_cache)
 
-    # Step 2: Set operations (intersection and differences)
-    keys_a = set(df_a['temp_key'])
-    keys_b = set(df_b['temp_key'])
+    # Step 2: Hash-join each dataset against the other's keys
+    # (the merge indicator marks rows whose key exists on the other side)
+    merged_a = df_a.merge(df_b[['temp_key']].drop_duplicates(), on='temp_key', how='left', indicator=True)
+    merged_b = df_b.merge(df_a[['temp_key']].drop_duplicates(), on='temp_key', how='left', indicator=True)
+    merged_a.pop('temp_key')
+    merged_b.pop('temp_key')
 
-    overlap_keys = keys_a.intersection(keys_b)  # A ∩ B
-    unique_a_keys = keys_a - keys_b             # A - B
-    unique_b_keys = keys_b - keys_a             # B - A
+    in_b = merged_a.pop('_merge') == 'both'       # A ∩ B
+    only_b = merged_b.pop('_merge') == 'left_only'  # B - A
 
-    # Step 3: Extract records based on keys
-    overlap = df_a[df_a['temp_key'].isin(overlap_keys)].to_dict('records')
-    unique_a = df_a[df_a['temp_key'].isin(unique_a_keys)].to_dict('records')
-    unique_b = df_b[df_b['temp_key'].isin(unique_b_keys)].to_dict('records')
+    # Step 3: Split into the partitions
+    overlap = merged_a[in_b].assign(fuzzy_match=False)
+    unique_a = merged_a[~in_b]
+    unique_b = merged_b[only_b]
 
     # Step 4: Fuzzy matching pass (NEW - catches typos and minor variations)
-    if use_fuzzy and unique_a and unique_b:
-        fuzzy_matches, unique_a, unique_b = fuzzy_match_pass(unique_a, unique_b)
+    # Only the columns it reads are turned into dicts
+    if use_fuzzy and not unique_a.empty and not unique_b.empty:
+        pairs = _fuzzy_match_indices(
+            _fuzzy_records(unique_a),
+            _fuzzy_records(unique_b),
+            norm_cache=norm_cache,
+            workers=workers
+        )
         
-        # Add fuzzy matches to overlap (take from A for consistency)
-        for item_a, item_b in fuzzy_matches:
-            # Optionally add confidence score
-            item_a['fuzzy_match'] = True
-            overlap.append(item_a)
-
-    # Cleanup temp column from result dicts
-    for rec in overlap + unique_a + unique_b:
-        rec.pop('temp_key', None)
+        if pairs:
+            rows_a = [i for i, _ in pairs]
+            rows_b = [j for _, j in pairs]
+            
+            # Add fuzzy matches to overlap (take from A for consistency)
+            overlap = pd.concat([overlap, unique_a.iloc[rows_a].assign(fuzzy_match=True)])
+            unique_a = unique_a.drop(unique_a.index[rows_a])
+            unique_b = unique_b.drop(unique_b.index[rows_b])
 
-    return overlap, unique_a, unique_b
+    return (
+        overlap.reset_index(drop=True),
+        unique_a.reset_index(drop=True),
+        unique_b.reset_index(drop=True)
+    )
@@ -5,8 +5,7 @@ Handles deduplication across multiple RIS files, tracking which files
 each reference appears in and which duplicates were removed.
 """
 
-import pandas as pd
-from src.comparator import generate_key, normalize_title_for_key
+from src.comparator import generate_keys
 
 
 def deduplicate_multiple_files(file_data_list):
@@ -30,11 +29,12 @@ def deduplicate_multiple_files(file_data_list):
         if df.empty:
             continue
             
-        # Add source filename to each reference
+        # Add source filename and match key to each reference
+        # (keys are generated for the whole file at once)
         refs = df.to_dict('records')
-        for ref in refs:
+        for ref, key in zip(refs, generate_keys(df)):
             ref['source_file'] = filename
-            ref['match_key'] = generate_key(pd.Series(ref))
+            ref['match_key'] = key
         
         all_refs.extend(refs)
     
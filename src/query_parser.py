@@ -12,9 +12,15 @@ Example queries:
 """
 
 import re
+from functools import lru_cache
 from typing import List, Union, Dict, Any
 
 
+# Quoted phrase | parenthesis | word or operator (runs up to whitespace or a
+# parenthesis, quotes included)
+_TOKEN_PATTERN = re.compile(r'(?P<phrase>"[^"]*")|[()]|[^\s()]+')
+
+
 class QuerySyntaxError(Exception):
     """Raised when query syntax is invalid"""
     pass
@@ -65,48 +71,27 @@ def tokenize(query: str) -> List[str]:
         List of tokens
     """
     tokens = []
-    i = 0
     query = query.strip()
     
-    while i < len(query):
-        # Skip whitespace
-        if query[i].isspace():
-            i += 1
-            continue
-        
-        # Quoted phrase - capture everything inside quotes
-        if query[i] == '"':
-            j = i + 1
-            while j < len(query) and query[j] != '"':
-                j += 1
-            if j >= len(query):
-                raise QuerySyntaxError(f"Unclosed quote at position {i}")
-            tokens.append(query[i:j+1])  # Include quotes
-            i = j + 1
-            continue
-        
-        # Parentheses
-        if query[i] in '()':
-            tokens.append(query[i])
-            i += 1
-            continue
-        
-        # Word or operator
-        j = i
-        while j < len(query) and not query[j].isspace() and query[j] not in '()':
-            j += 1
-        word = query[i:j]
-        if word:
-            tokens.append(word)
-        i = j
+    for match in _TOKEN_PATTERN.finditer(query):
+        token = match.group()
+        # A quote that starts a word was never closed (a closed one would
+        # have matched as a phrase)
+        if token[0] == '"' and match.lastgroup != 'phrase':
+            raise QuerySyntaxError(f"Unclosed quote at position {match.start()}")
+        tokens.append(token)
     
     return tokens
 
 
+@lru_cache(maxsize=512)
 def parse_query(query: str) -> ASTNode:
     """
     Parse query string into Abstract Syntax Tree.
     
+    Results are cached per query string, so repeated queries share one
+    AST; callers must not modify it.
+    
     Grammar:
         expression := term | expression AND expression | expression OR expression | (expression)
         term := word | "phrase" | word* | *word
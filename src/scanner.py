@@ -0,0 +1,107 @@
+"""
+Literal Scanner for the Search Engine
+
+Finds which of a small set of byte-string needles occur in each of many
+texts. A whole column of texts is packed into one byte buffer and scanned
+with Boyer-Moore-Horspool in a single Numba-compiled call.
+"""
+
+import numpy as np
+from numba import njit
+from typing import List
+
+
+def pack_texts(texts: List[bytes]):
+    """
+    Pack byte strings into one contiguous buffer.
+
+    Args:
+        texts: Byte strings to pack
+
+    Returns:
+        (chars: uint8 array of all bytes, offsets: int64 array where text i
+         spans chars[offsets[i]:offsets[i + 1]])
+    """
+    offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+    np.cumsum([len(text) for text in texts], out=offsets[1:])
+    chars = np.frombuffer(b''.join(texts), dtype=np.uint8)
+    return chars, offsets
+
+
+@njit(cache=True)
+def shift_tables(needles, needle_offsets):
+    """
+    Build the Horspool bad-character shift table of every packed needle.
+    
+    Returns:
+        int64 array (n_needles, 256)
+    """
+    n_needles = needle_offsets.shape[0] - 1
+    shifts = np.empty((n_needles, 256), dtype=np.int64)
+    for k in range(n_needles):
+        start = needle_offsets[k]
+        m = needle_offsets[k + 1] - start
+        shifts[k, :] = m
+        for j in range(m - 1):
+            shifts[k, needles[start + j]] = m - 1 - j
+    return shifts
+
+
+@njit(cache=True)
+def scan_literals(chars, offsets, needles, needle_offsets, found):
+    """
+    Mark which needles occur in each packed text.
+    
+    Within each row every needle is searched with Boyer-Moore-Horspool,
+    stopping at its first occurrence. The kernel is deliberately serial:
+    it is called from Flask's request threads, and Numba's parallel
+    threading layers are not safe under concurrent calls or across the
+    comparator's process pool.
+    
+    Args:
+        chars, offsets: Packed texts (see pack_texts)
+        needles, needle_offsets: Packed needles (non-empty)
+        found: bool array (n_texts, n_needles), set to True on a hit
+    """
+    shifts = shift_tables(needles, needle_offsets)
+    
+    for row in range(offsets.shape[0] - 1):
+        end = offsets[row + 1]
+        for k in range(needle_offsets.shape[0] - 1):
+            start = needle_offsets[k]
+            m = needle_offsets[k + 1] - start
+            last = needles[start + m - 1]
+            i = offsets[row]
+            while i <= end - m:
+                c = chars[i + m - 1]
+                if c == last:
+                    j = m - 2
+                    while j >= 0 and chars[i + j] == needles[start + j]:
+                        j -= 1
+                    if j < 0:
+                        found[row, k] = True
+                        break
+                i += shifts[k, c]
+
+
+def find_literals(texts: List[bytes], needles: List[bytes]) -> np.ndarray:
+    """
+    Check every needle against every text.
+
+    Args:
+        texts: Byte strings to search in
+        needles: Non-empty byte strings to search for
+
+    Returns:
+        bool array (len(texts), len(needles)), True where the needle occurs
+    """
+    found = np.zeros((len(texts), len(needles)), dtype=np.bool_)
+    if texts and needles:
+        chars, offsets = pack_texts(texts)
+        needle_chars, needle_offsets = pack_texts(needles)
+        scan_literals(chars, offsets, needle_chars, needle_offsets, found)
+    return found
+
+
+# Compile (or load from the on-disk cache) at import, not on the first search
+find_literals([b'warm up'], [b'up'])
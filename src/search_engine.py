@@ -5,10 +5,44 @@ Executes Boolean search queries against reference datasets with field selection,
 wildcard matching, and term highlighting.
 """
 
+import datetime
+import hashlib
+import os
 import re
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+import joblib
+import numpy as np
 import pandas as pd
-from typing import List, Dict, Any, Tuple, Set
+from typing import List, Dict, Any, Optional, Tuple, Set
 from src.query_parser import ASTNode, TermNode, OperatorNode, parse_query
+from src.scanner import find_literals
+
+try:
+    import hyperscan
+except ImportError:  # Optional: fall back to the Numba literal scanner
+    hyperscan = None
+
+
+# Map field names to the columns they may be stored under
+FIELD_COLUMNS = {
+    'title': ['title', 'ti', 'primary_title'],
+    'abstract': ['abstract', 'ab', 'n2'],
+    'keywords': ['keywords', 'kw'],
+    'journal': ['journal_name', 'jo', 't2'],
+    'authors': ['authors', 'au', 'a1']
+}
+
+# Fields whose matches are highlighted in the results
+HIGHLIGHT_FIELDS = ('title', 'abstract')
+
+# Queries with at least this many literal needles are prefiltered with
+# Hyperscan (when installed) instead of the Numba scanner
+HYPERSCAN_MIN_NEEDLES = 32
+
 
 
 def wildcard_to_regex(term: str) -> str:
@@ -50,11 +84,24 @@ def match_term(term: str, text: str, is_phrase: bool = False) -> Tuple[bool, Lis
     
     text_str = str(text)
     
-    # Check if term contains wildcards
-    has_wildcard = '*' in term
+    matches = _compile_term(term).findall(text_str)
+    return len(matches) > 0, matches
+
+
+def term_pattern(term: str) -> str:
+    """
+    Build the regex pattern for a search term or phrase.
     
-    # For both phrases and terms, handle wildcards the same way
-    if has_wildcard:
+    Phrases and plain terms are matched the same way; wildcards become \\w*
+    and word boundaries are added except where a wildcard sits at the edge.
+    
+    Args:
+        term: Search term (may contain wildcards)
+        
+    Returns:
+        Regex pattern string (compile with re.IGNORECASE)
+    """
+    if '*' in term:
         # Convert wildcard to regex pattern
         pattern = wildcard_to_regex(term)
         # Add word boundaries to prevent partial word matches
@@ -63,27 +110,271 @@ def match_term(term: str, text: str, is_phrase: bool = False) -> Tuple[bool, Lis
             pattern = r'\b' + pattern
         if not term.endswith('*'):
             pattern = pattern + r'\b'
-        
-        regex = re.compile(pattern, re.IGNORECASE)
-        matches = regex.findall(text_str)
-        return len(matches) > 0, matches
-    elif is_phrase:
-        # Exact phrase match without wildcards (case insensitive)
-        # Use word boundaries for phrases too
-        pattern = r'\b' + re.escape(term) + r'\b'
-        regex = re.compile(pattern, re.IGNORECASE)
-        matches = regex.findall(text_str)
-        return len(matches) > 0, matches
-    else:
-        # Regular term with word boundaries
-        pattern = r'\b' + re.escape(term) + r'\b'
-        regex = re.compile(pattern, re.IGNORECASE)
-        matches = regex.findall(text_str)
-        return len(matches) > 0, matches
+        return pattern
+    
+    # Exact term/phrase match (case insensitive) with word boundaries
+    return r'\b' + re.escape(term) + r'\b'
+
 
+@lru_cache(maxsize=512)
+def _compile_term(term: str):
+    """Compile (and cache) the case-insensitive regex for a search term."""
+    return re.compile(term_pattern(term), re.IGNORECASE)
 
 
+def _fold_case(text: str) -> str:
+    """
+    Case-fold text for literal prefiltering.
+    
+    Python's re.IGNORECASE treats dotted/dotless I as plain i, so they are
+    folded to i first; every pair of characters re considers equal then
+    folds to the same string.
+    """
+    if text.isascii():
+        return text.lower()
+    return text.replace('\u0130', 'i').replace('\u0131', 'i').casefold()
+
 
+def _fold_column(texts: List[str]) -> List[bytes]:
+    """Case-fold and UTF-8 encode a column of texts once (None -> b'')."""
+    # ASCII cells (the usual case for titles/abstracts) take str.lower's
+    # ASCII fast path inline, without a _fold_case call each
+    return [
+        b'' if text is None
+        else text.lower().encode('ascii') if text.isascii()
+        else _fold_case(text).encode('utf-8')
+        for text in texts
+    ]
+
+
+def _as_text(value: Any):
+    """Return the searchable string for a field value, or None if empty."""
+    if not value or pd.isna(value):
+        return None
+    return str(value)
+
+
+def _collect_match(needle_id, start, end, flags, needle_ids):
+    """Hyperscan match callback: record which needle fired."""
+    needle_ids.append(needle_id)
+
+
+class CompiledQuery:
+    """
+    A parsed query prepared for scanning many references.
+    
+    Every distinct leaf term gets a bit; a multi-literal matcher over the
+    leaves' literal parts finds, in one pass over a field, which leaves can
+    possibly match there, and only those are checked with their regex. The
+    AND/OR tree is then evaluated column-wise over per-leaf hit arrays.
+    """
+    def __init__(self, ast: ASTNode, fields: Tuple[str, ...]):
+        self.ast = ast
+        self.field_columns = [(field, FIELD_COLUMNS.get(field, [field])) for field in fields]
+        
+        # One bit per distinct (term, is_phrase) leaf
+        self.leaves = []
+        leaf_bits = {}
+        self.evaluate = self._build_evaluator(ast, leaf_bits)
+        self.regexes = [_compile_term(leaf.term) for leaf in self.leaves]
+        
+        # Prefilter: a leaf can only match if its longest literal part (the
+        # text between wildcards) occurs in the case-folded field. Leaves
+        # without one (e.g. "*" or "") are always checked (needle -1).
+        self.needles = []
+        self.leaf_needles = []
+        for leaf in self.leaves:
+            needle = _fold_case(max(leaf.term.split('*'), key=len)).encode('utf-8')
+            if not needle:
+                self.leaf_needles.append(-1)
+                continue
+            if needle not in self.needles:
+                self.needles.append(needle)
+            self.leaf_needles.append(self.needles.index(needle))
+        
+        # What scan() does per leaf, resolved once per query: the leaf's bit,
+        # its prefilter needle and the bound findall of its regex
+        self.leaf_scans = [
+            (bit, needle, regex.findall)
+            for bit, (needle, regex) in enumerate(zip(self.leaf_needles, self.regexes))
+        ]
+        
+        # One Numba pass per column is cheaper than a Hyperscan call per row
+        # until there are many needles, since BMH scans once per needle
+        self.database = None
+        if len(self.needles) >= HYPERSCAN_MIN_NEEDLES and hyperscan is not None:
+            self.database = hyperscan.Database(mode=hyperscan.HS_MODE_BLOCK)
+            self.database.compile(
+                expressions=self.needles,
+                ids=list(range(len(self.needles))),
+                flags=hyperscan.HS_FLAG_SINGLEMATCH,
+                literal=True
+            )
+    
+    def _build_evaluator(self, node: ASTNode, leaf_bits: Dict):
+        """
+        Turn the AST into a function of the (n_leaves, n_rows) hit array.
+        
+        Chains of the same operator (A OR B OR C ...) are flattened into one
+        n-ary node, so a long list of synonyms is a single numpy reduce over
+        its leaves' rows rather than hundreds of nested binary operations.
+        """
+        if isinstance(node, TermNode):
+            bit = self._leaf_bit(node, leaf_bits)
+            return lambda leaf_hits: leaf_hits[bit]
+        
+        # Operands of the chain, left to right, collected without recursion
+        operands = []
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            if isinstance(current, OperatorNode) and current.operator == node.operator:
+                stack.append(current.right)
+                stack.append(current.left)
+            else:
+                operands.append(current)
+        
+        bits = []
+        children = []
+        for operand in operands:
+            if isinstance(operand, TermNode):
+                bits.append(self._leaf_bit(operand, leaf_bits))
+            else:
+                children.append(self._build_evaluator(operand, leaf_bits))
+        
+        combine = np.logical_and if node.operator == 'AND' else np.logical_or
+        
+        def evaluate(leaf_hits):
+            result = combine.reduce(leaf_hits[bits], axis=0) if bits else None
+            for child in children:
+                result = child(leaf_hits) if result is None else combine(result, child(leaf_hits))
+            return result
+        
+        return evaluate
+    
+    def _leaf_bit(self, node: TermNode, leaf_bits: Dict) -> int:
+        """Return the bit of a leaf, assigning the next one to a new term."""
+        key = (node.term, node.is_phrase)
+        if key not in leaf_bits:
+            leaf_bits[key] = len(self.leaves)
+            self.leaves.append(node)
+        return leaf_bits[key]
+    
+    def find_needles(self, folded: List[bytes]) -> np.ndarray:
+        """
+        Check every needle against a column of case-folded texts.
+        
+        Args:
+            folded: Column texts as returned by _fold_column
+        
+        Returns:
+            bool array (len(folded), len(needles)), True where the needle
+            occurs in the text
+        """
+        if self.database is None:
+            return find_literals(folded, self.needles)
+        
+        # Hyperscan scratch space can't be shared between threads, so each
+        # column gets its own
+        found = np.zeros((len(folded), len(self.needles)), dtype=bool)
+        scratch = hyperscan.Scratch(self.database)
+        for pos, text in enumerate(folded):
+            if text:
+                needle_ids = []
+                self.database.scan(text, match_event_handler=_collect_match,
+                                   context=needle_ids, scratch=scratch)
+                found[pos, needle_ids] = True
+        return found
+    
+    def candidates(self, texts: List[str]) -> np.ndarray:
+        """
+        Prefilter a column: which rows each leaf can possibly match in.
+        
+        Args:
+            texts: Column texts as returned by _as_text
+        
+        Returns:
+            bool array (n_leaves, len(texts))
+        """
+        # Each cell is case-folded exactly once, for all needles
+        found = self.find_needles(_fold_column(texts))
+        present = np.array([text is not None for text in texts], dtype=bool)
+        
+        candidates = np.empty((len(self.leaves), len(texts)), dtype=bool)
+        for bit, needle, _ in self.leaf_scans:
+            candidates[bit] = found[:, needle] if needle >= 0 else present
+        return candidates
+    
+    def confirm(self, field: str, texts: List[str], candidates: np.ndarray,
+                leaf_hits: np.ndarray, row_matches: Dict) -> None:
+        """Run each leaf's regex on its candidate rows, recording the matches."""
+        for bit, _, findall in self.leaf_scans:
+            for pos in np.flatnonzero(candidates[bit]).tolist():
+                matches = findall(texts[pos])
+                if matches:
+                    leaf_hits[bit, pos] = True
+                    row_matches.setdefault(pos, {}).setdefault(field, set()).update(matches)
+    
+    def scan(self, df: pd.DataFrame) -> Tuple[np.ndarray, Dict[int, Dict[str, Set[str]]]]:
+        """
+        Match every leaf against every row, one column at a time.
+        
+        Title/abstract matches are highlighted in every row, matched or not,
+        so those columns are checked in full. Matches in other fields are
+        only reported for matched rows: since AND/OR can only gain matches
+        from more hits, rows that fail the query even if every remaining
+        prefilter candidate were a real match skip their regex checks there.
+        
+        Returns:
+            (leaf_hits: bool array, leaf x row, True where the leaf matched
+             in any field (exact for rows that match the query),
+             row_matches: Dict[row position -> Dict[field_name -> Set[matched_terms]]]
+             for rows with at least one match)
+        """
+        leaf_hits = np.zeros((len(self.leaves), len(df)), dtype=bool)
+        row_matches = {}
+        deferred = []
+        
+        for field, columns in self.field_columns:
+            for col in columns:
+                if col not in df.columns:
+                    continue
+                
+                # Scan the column as one contiguous object array rather than
+                # hopping between per-row dicts or Series; the regexes run on
+                # the original text. Columns are prefiltered one by one: the
+                # scanner is already one call per column, so packing all
+                # fields into one buffer saves nothing and would lose which
+                # column a candidate came from
+                texts = [_as_text(value) for value in df[col].to_numpy(dtype=object)]
+                candidates = self.candidates(texts)
+                
+                if field in HIGHLIGHT_FIELDS:
+                    self.confirm(field, texts, candidates, leaf_hits, row_matches)
+                else:
+                    deferred.append((field, texts, candidates))
+        
+        if deferred:
+            possible = leaf_hits.copy()
+            for _, _, candidates in deferred:
+                possible |= candidates
+            can_match = self.evaluate(possible)
+            
+            for field, texts, candidates in deferred:
+                self.confirm(field, texts, candidates & can_match, leaf_hits, row_matches)
+        
+        return leaf_hits, row_matches
+
+
+@lru_cache(maxsize=128)
+def compile_query(query: str, fields: Tuple[str, ...]) -> CompiledQuery:
+    """
+    Parse and compile a query for the given search fields (cached).
+    
+    Raises:
+        QuerySyntaxError: If query syntax is invalid
+    """
+    return CompiledQuery(parse_query(query), fields)
 
 
 def evaluate_ast(node: ASTNode, reference: Dict[str, Any], fields: List[str]) -> Tuple[bool, Dict[str, Set[str]]]:
@@ -104,16 +395,7 @@ def evaluate_ast(node: ASTNode, reference: Dict[str, Any], fields: List[str]) ->
         field_matches = {}
         
         for field in fields:
-            # Map field names to possible column names
-            field_columns = {
-                'title': ['title', 'ti', 'primary_title'],
-                'abstract': ['abstract', 'ab', 'n2'],
-                'keywords': ['keywords', 'kw'],
-                'journal': ['journal_name', 'jo', 't2'],
-                'authors': ['authors', 'au', 'a1']
-            }
-            
-            possible_cols = field_columns.get(field, [field])
+            possible_cols = FIELD_COLUMNS.get(field, [field])
             matched_terms = set()
             
             for col in possible_cols:
@@ -155,6 +437,17 @@ def evaluate_ast(node: ASTNode, reference: Dict[str, Any], fields: List[str]) ->
 
 
 
+@lru_cache(maxsize=256)
+def _compile_highlight(terms: Tuple[str, ...]):
+    """
+    Compile a case-insensitive alternation of literal terms as one capturing
+    group, so split() keeps the matches (None if no terms).
+    """
+    if not terms:
+        return None
+    return re.compile('(' + '|'.join(map(re.escape, terms)) + ')', re.IGNORECASE)
+
+
 def highlight_text(text: str, matched_terms: Set[str]) -> str:
     """
     Highlight matched terms in text using HTML <mark> tags.
@@ -174,82 +467,240 @@ def highlight_text(text: str, matched_terms: Set[str]) -> str:
     
     text_str = str(text)
     
-    # Find all match positions with their terms
-    matches = []
-    for term in matched_terms:
-        if not term:
-            continue
-        
-        # Find all occurrences of this term (case insensitive)
-        pattern = re.compile(re.escape(term), re.IGNORECASE)
-        for match in pattern.finditer(text_str):
-            matches.append({
-                'start': match.start(),
-                'end': match.end(),
-                'term': match.group(),  # Use actual matched text (preserves case)
-                'length': match.end() - match.start()
-            })
-    
-    if not matches:
+    # One compiled alternation of all terms, shortest first: scanning left to
+    # right, each match is the earliest remaining occurrence and, at that
+    # position, the shortest term - the same choice as a greedy pass over all
+    # matches sorted by (start, length), which leaves room for more matches
+    pattern = _compile_highlight(tuple(sorted(
+        (term for term in matched_terms if term),
+        key=lambda term: (len(term), term)
+    )))
+    if pattern is None:
         return text_str
     
-    # Sort by start position, then by length (shorter first to maximize count)
-    # Shorter matches allow more room for other matches
-    matches.sort(key=lambda m: (m['start'], m['length']))
-    
-    # Track which positions are already highlighted
-    highlighted_positions = set()
-    selected_matches = []
-    
-    # Greedy algorithm: select matches that don't overlap, prioritizing:
-    # 1. Earlier position (left to right)
-    # 2. Shorter length (to leave room for more matches)
-    for match in matches:
-        positions = set(range(match['start'], match['end']))
-        # Check if this match overlaps with any already selected
-        if not positions.intersection(highlighted_positions):
-            selected_matches.append(match)
-            highlighted_positions.update(positions)
-    
-    # Sort selected matches by position for proper insertion
-    selected_matches.sort(key=lambda m: m['start'])
+    # split() cuts the text at every match in one C-level pass, leaving the
+    # matches (the actual text, so its case is preserved) at odd positions;
+    # no match objects or span tuples are created per hit
+    parts = pattern.split(text_str)
+    parts[1::2] = [f"<mark>{term}</mark>" for term in parts[1::2]]
     
-    # Build highlighted string by inserting <mark> tags
-    result = []
-    last_pos = 0
-    
-    for match in selected_matches:
-        # Add text before this match
-        result.append(text_str[last_pos:match['start']])
-        # Add highlighted match
-        result.append(f"<mark>{match['term']}</mark>")
-        last_pos = match['end']
-    
-    # Add remaining text
-    result.append(text_str[last_pos:])
-    
-    return ''.join(result)
+    return ''.join(parts)
+
+
+
+class _ResultCache:
+    """Small thread-safe LRU of search results (see search_references)."""
+    def __init__(self, maxsize: int = 32):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+    
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
 
+_RESULT_CACHE = _ResultCache(maxsize=32)
+
+# Results also persist on disk, so searching the same file again in a new
+# process is free. The store lives under the project root unless
+# REFANALYSIS_CACHE_DIR says otherwise (empty: no disk cache); entries unused
+# for CACHE_MAX_AGE, and the least recently used beyond CACHE_BYTES_LIMIT,
+# are pruned at most every CACHE_PRUNE_INTERVAL seconds while searching
+CACHE_DIR = os.environ.get(
+    'REFANALYSIS_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.refanalysis_cache')
+)
+CACHE_BYTES_LIMIT = '512M'
+CACHE_MAX_AGE = datetime.timedelta(days=7)
+CACHE_PRUNE_INTERVAL = 600
+
+
+def _source_version() -> str:
+    """Hash the search code, so disk-cached results don't outlive it."""
+    h = hashlib.blake2b(digest_size=16)
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    for name in ('search_engine.py', 'query_parser.py', 'scanner.py'):
+        with open(os.path.join(src_dir, name), 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+_SOURCE_VERSION = _source_version()
+
+
+def _frame_fingerprint(df: pd.DataFrame) -> str:
+    """
+    Hash the contents of a DataFrame (columns, index and values).
+    
+    The app re-parses the uploaded file on every request, so results are
+    keyed by content rather than by the DataFrame object.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr(list(df.columns)).encode('utf-8'))
+    h.update(pd.util.hash_pandas_object(df.index, categorize=False).to_numpy().tobytes())
+    for col in df.columns:
+        values = df[col]
+        try:
+            hashed = pd.util.hash_pandas_object(values, index=False, categorize=False)
+        except (TypeError, ValueError):
+            # Columns of lists (e.g. authors) are hashed by their string form
+            hashed = pd.util.hash_pandas_object(values.astype(str), index=False, categorize=False)
+        h.update(hashed.to_numpy().tobytes())
+    return h.hexdigest()
 
 
 def search_references(
     df: pd.DataFrame,
     query: str,
-    fields: List[str]
-) -> Tuple[List[Dict], List[Dict], Dict[str, Any]]:
+    fields: List[str],
+    highlight_limit: Optional[int] = None
+) -> Tuple[pd.DataFrame, pd.DataFrame, Dict[str, Any]]:
     """
     Search references using Boolean query.
     
+    Results are cached by query, fields and DataFrame contents, in memory
+    and on disk (CACHE_DIR), so repeating a search (e.g. for an export, or
+    after a restart) is free. Cached results are shared between calls and
+    must not be modified; search_references.cache_clear() empties the
+    caches.
+    
     Args:
         df: DataFrame of references
         query: Boolean search query string
         fields: List of fields to search in (e.g., ['title', 'abstract'])
+        highlight_limit: Only highlight the first N matched and the first N
+            unmatched references (e.g. the ones displayed); the rest get
+            None. All references are highlighted if None.
         
     Returns:
-        (matched_refs, unmatched_refs, stats)
+        (matched_refs, unmatched_refs, stats), the references as DataFrames
+        with the columns of df plus <column>_highlighted for the title and
+        abstract columns (None where nothing matched); matched_refs also
+        has matched_terms and match_count
+    
+    Raises:
+        ValueError: If highlight_limit is negative
+    """
+    if highlight_limit is not None and highlight_limit < 0:
+        raise ValueError(f"highlight_limit must be non-negative, got {highlight_limit}")
+    
+    if df.empty:
+        return _search_references(df, query, fields, highlight_limit)
+    
+    key = (query, tuple(fields), highlight_limit, _frame_fingerprint(df))
+    result = _RESULT_CACHE.get(key)
+    if result is None:
+        result = _DISK_CACHE.search(*key, _SOURCE_VERSION, df)
+        _RESULT_CACHE.put(key, result)
+    return result
+
+
+def _search_references_on_disk(query, fields, highlight_limit, fingerprint, source_version, df):
+    """
+    Body of the disk cache (see _DiskCache), keyed by the arguments other
+    than df (fingerprint stands in for its contents).
     """
+    return _search_references(df, query, list(fields), highlight_limit)
+
+
+class _DiskCache:
+    """
+    joblib.Memory store of search results, created on first use.
+    
+    The disk cache is an optimisation only: if the store can't be created
+    or written, searches are computed without it.
+    """
+    def __init__(self, location: str):
+        self.location = location
+        self._memory = None
+        self._search = None
+        self._unavailable = not location
+        self._last_prune = None
+        self._lock = threading.Lock()
+    
+    def _cached_search(self):
+        """Return the disk-cached search function (None if unavailable)."""
+        with self._lock:
+            if self._search is None and not self._unavailable:
+                try:
+                    os.makedirs(self.location, exist_ok=True)
+                    self._memory = joblib.Memory(self.location, verbose=0)
+                    self._search = self._memory.cache(_search_references_on_disk, ignore=['df'])
+                except OSError:
+                    self._unavailable = True
+            return self._search
+    
+    def _prune(self):
+        """Drop stale and excess entries, at most every CACHE_PRUNE_INTERVAL."""
+        with self._lock:
+            now = time.monotonic()
+            if self._last_prune is not None and now - self._last_prune < CACHE_PRUNE_INTERVAL:
+                return
+            self._last_prune = now
+            try:
+                self._memory.reduce_size(bytes_limit=CACHE_BYTES_LIMIT, age_limit=CACHE_MAX_AGE)
+            except (OSError, ValueError):
+                pass  # another process pruned or cleared the store meanwhile
+    
+    def search(self, *args):
+        """Call _search_references_on_disk(*args) through the store."""
+        cached_search = self._cached_search()
+        if cached_search is not None:
+            try:
+                result = cached_search(*args)
+            except OSError:
+                pass  # e.g. the cache directory became unwritable
+            else:
+                self._prune()
+                return result
+        return _search_references_on_disk(*args)
+    
+    def clear(self):
+        """Delete every stored result."""
+        with self._lock:
+            memory = self._memory
+            if memory is None and self.location and os.path.isdir(self.location):
+                memory = joblib.Memory(self.location, verbose=0)
+            if memory is not None:
+                memory.clear(warn=False)
+
+
+_DISK_CACHE = _DiskCache(CACHE_DIR)
+
+
+def _cache_clear():
+    """Empty the in-memory and on-disk result caches."""
+    _RESULT_CACHE.clear()
+    _DISK_CACHE.clear()
+
+
+search_references.cache_clear = _cache_clear
+
+
+def _search_references(
+    df: pd.DataFrame,
+    query: str,
+    fields: List[str],
+    highlight_limit: Optional[int] = None
+) -> Tuple[pd.DataFrame, pd.DataFrame, Dict[str, Any]]:
+    """Uncached body of search_references."""
     if df.empty:
-        return [], [], {
+        return df.iloc[:0], df.iloc[:0], {
             'total_refs': 0,
             'matched_count': 0,
             'unmatched_count': 0,
@@ -259,11 +710,11 @@ def search_references(
             'error': None
         }
     
-    # Parse query
+    # Parse and compile the query (once per query / field selection)
     try:
-        ast = parse_query(query)
+        compiled = compile_query(query, tuple(fields))
     except Exception as e:
-        return [], [], {
+        return df.iloc[:0], df.iloc[:0], {
             'total_refs': len(df),
             'matched_count': 0,
             'unmatched_count': len(df),
@@ -273,59 +724,52 @@ def search_references(
             'error': str(e)
         }
     
-    # Evaluate each reference
-    matched_refs = []
-    unmatched_refs = []
-    
-    for idx, row in df.iterrows():
-        reference = row.to_dict()
-        
-        # Evaluate AST - now returns field-specific matches
-        is_match, field_matches = evaluate_ast(ast, reference, fields)
+    # Match all leaves column by column, then evaluate the query for every
+    # row at once; row_matches also holds partial matches of unmatched rows
+    leaf_hits, row_matches = compiled.scan(df)
+    is_match = compiled.evaluate(leaf_hits)
+    
+    # Rows that get highlights: all, or the first highlight_limit matched
+    # and unmatched references
+    shown = None
+    if highlight_limit is not None:
+        shown = np.zeros(len(df), dtype=bool)
+        shown[np.flatnonzero(is_match)[:highlight_limit]] = True
+        shown[np.flatnonzero(~is_match)[:highlight_limit]] = True
+    
+    # Highlight title/abstract matches (partial ones too, so unmatched
+    # references still show them) one column at a time, visiting only the
+    # rows that have hits in that field; other rows get None
+    highlights = {}
+    for field in HIGHLIGHT_FIELDS:
+        rows = [
+            pos for pos, field_matches in row_matches.items()
+            if field in field_matches and (shown is None or shown[pos])
+        ]
         
-        if is_match:
-            # Add highlighting for matched fields
-            ref_copy = reference.copy()
-            
-            # Highlight title if it's a search field AND it has matches
-            if 'title' in field_matches:
-                for col in ['title', 'ti', 'primary_title']:
-                    if col in ref_copy and ref_copy[col]:
-                        ref_copy[f'{col}_highlighted'] = highlight_text(ref_copy[col], field_matches['title'])
-            
-            # Highlight abstract if it's a search field AND it has matches
-            if 'abstract' in field_matches:
-                for col in ['abstract', 'ab', 'n2']:
-                    if col in ref_copy and ref_copy[col]:
-                        ref_copy[f'{col}_highlighted'] = highlight_text(ref_copy[col], field_matches['abstract'])
-            
-            # Collect all matched terms from all fields for display
-            # Use list instead of set to count all occurrences
-            all_matched_terms = []
-            for field_terms in field_matches.values():
-                all_matched_terms.extend(field_terms)
-            
-            ref_copy['matched_terms'] = all_matched_terms  # Now includes duplicates
-            ref_copy['match_count'] = len(all_matched_terms)  # Total occurrences
-            matched_refs.append(ref_copy)
-        else:
-            # Even for unmatched, apply highlighting for any partial matches
-            ref_copy = reference.copy()
-            
-            # Highlight title if there were any title matches (even if query failed overall)
-            if 'title' in field_matches:
-                for col in ['title', 'ti', 'primary_title']:
-                    if col in ref_copy and ref_copy[col]:
-                        ref_copy[f'{col}_highlighted'] = highlight_text(ref_copy[col], field_matches['title'])
-            
-            # Highlight abstract if there were any abstract matches
-            if 'abstract' in field_matches:
-                for col in ['abstract', 'ab', 'n2']:
-                    if col in ref_copy and ref_copy[col]:
-                        ref_copy[f'{col}_highlighted'] = highlight_text(ref_copy[col], field_matches['abstract'])
-            
-            unmatched_refs.append(ref_copy)
-
+        for col in FIELD_COLUMNS[field]:
+            if col not in df.columns:
+                continue
+            values = df[col].to_numpy(dtype=object)
+            highlighted = np.full(len(df), None, dtype=object)
+            for pos in rows:
+                if values[pos]:
+                    highlighted[pos] = highlight_text(values[pos], row_matches[pos][field])
+            highlights[f'{col}_highlighted'] = highlighted
+    
+    results = df.assign(**highlights)
+    
+    # Collect all matched terms from all fields for display
+    # Use list instead of set to count all occurrences
+    matched_terms = np.empty(int(is_match.sum()), dtype=object)
+    for i, pos in enumerate(np.flatnonzero(is_match)):
+        matched_terms[i] = [term for field_terms in row_matches[pos].values() for term in field_terms]
+    
+    matched_refs = results[is_match].assign(
+        matched_terms=matched_terms,  # Now includes duplicates
+        match_count=np.array([len(terms) for terms in matched_terms], dtype=np.int64)  # Total occurrences
+    ).reset_index(drop=True)
+    unmatched_refs = results[~is_match].reset_index(drop=True)
     
     # Calculate statistics
     total = len(df)
@@ -379,10 +823,10 @@ if __name__ == "__main__":
     print(f"Query: {query}")
     print(f"Stats: {stats}")
     print(f"\nMatched: {len(matched)}")
-    for ref in matched:
+    for _, ref in matched.iterrows():
         print(f"  - {ref.get('title', 'N/A')}")
         print(f"    Matched terms: {ref.get('matched_terms', [])}")
     
     print(f"\nUnmatched: {len(unmatched)}")
-    for ref in unmatched:
+    for _, ref in unmatched.iterrows():
         print(f"  - {ref.get('title', 'N/A')}")
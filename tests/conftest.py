@@ -0,0 +1,8 @@
+"""Shared pytest configuration for the test suite (see pytest.ini)."""
+import os
+
+# No disk cache for search results: the tests must run the code under test
+# rather than read results a previous run left in the project's cache, and
+# must not write into the working tree. Set before any test module imports
+# src.search_engine; the cache tests use their own store under tmp_path.
+os.environ['REFANALYSIS_CACHE_DIR'] = ''
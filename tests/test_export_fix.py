@@ -33,5 +33,29 @@ def test_export_nan_handling():
         print(f"FAILED: {e}")
         sys.exit(1)
 
+def test_export_format():
+    # Pins the exact bytes: records separated by a blank line, and the
+    # export ends with a single newline after the last ER line
+    records = [
+        {'type_of_reference': 'JOUR', 'title': 'First', 'authors': ['A, B.'], 'year': 2020},
+        {'type_of_reference': 'BOOK', 'title': 'Second', 'doi': '10.1/x'},
+    ]
+    
+    assert export_to_ris_string(records) == (
+        "TY  - JOUR\n"
+        "TI  - First\n"
+        "AU  - A, B.\n"
+        "PY  - 2020\n"
+        "ER  - \n"
+        "\n"
+        "TY  - BOOK\n"
+        "TI  - Second\n"
+        "DO  - 10.1/x\n"
+        "ER  - \n"
+    )
+    assert export_to_ris_string(records[:1]).endswith("PY  - 2020\nER  - \n")
+    assert export_to_ris_string([]) == ""
+
 if __name__ == "__main__":
     test_export_nan_handling()
+    test_export_format()
@@ -17,9 +17,13 @@ from src.parser import parse_ris_file, entries_to_df
 from src.comparator import (
     compare_datasets, 
     normalize_title_for_key,
-    fuzzy_match_pass,
-    calculate_match_confidence
+    generate_key,
+    generate_keys,
+    calculate_match_confidence,
+    greedy_assign,
+    _has_doi
 )
+import numpy as np
 import pandas as pd
 
 
@@ -81,7 +85,7 @@ def test_fuzzy_matching():
         print("✅ PASS: Fuzzy matching caught all variations")
         
         # Check which were fuzzy matches
-        fuzzy_count = sum(1 for item in overlap if item.get('fuzzy_match'))
+        fuzzy_count = int(overlap['fuzzy_match'].sum())
         print(f"   Fuzzy matches: {fuzzy_count}")
         
         return True
@@ -146,7 +150,7 @@ def test_missing_year_handling():
         print("✅ PASS: Papers with years matched correctly")
         
         # Check overlap items
-        for item in overlap:
+        for item in overlap.to_dict('records'):
             title = item.get('title', '')
             year = item.get('year', 'None')
             print(f"   Matched: '{title}' (year: {year})")
@@ -219,11 +223,11 @@ def test_real_sample_data():
     # Expected: 1 unique to B (Quantum Computing)
     
     # Check for fuzzy matches
-    fuzzy_count = sum(1 for item in overlap if item.get('fuzzy_match'))
+    fuzzy_count = int(overlap['fuzzy_match'].sum())
     print(f"  Fuzzy matches: {fuzzy_count}")
     
     print("\nOverlap items:")
-    for item in overlap:
+    for item in overlap.to_dict('records'):
         title = item.get('title', item.get('ti', 'N/A'))
         is_fuzzy = '(FUZZY)' if item.get('fuzzy_match') else ''
         print(f"  - {title} {is_fuzzy}")
@@ -294,6 +298,157 @@ def test_edge_cases():
     return failed == 0
 
 
+def test_vectorized_key_generation():
+    """Test that generate_keys produces the same keys as generate_key row by row."""
+    print("\n=== TEST 8: Vectorized Key Generation ===")
+    
+    df = pd.DataFrame([
+        {'title': 'The Impact of AI', 'year': 2023, 'doi': None},
+        {'title': 'A Study', 'year': '2021', 'doi': ' 10.1234/ABC '},
+        {'title': 'Étude des données', 'year': None, 'doi': None},
+        {'title': None, 'year': '2020', 'doi': ''},
+        {'title': 'An Overview', 'year': '  ', 'doi': None},
+    ])
+    
+    # Both alias columns: NaN / empty cells fall through to the next alias
+    df_aliases = pd.DataFrame([
+        {'doi': np.nan, 'do': '10.2/y', 'title': 'X', 'ti': None, 'year': np.nan, 'py': '2019'},
+        {'doi': '', 'do': '10.3/z', 'title': np.nan, 'ti': 'Alias Title', 'year': '2020', 'py': None},
+        {'doi': '10.1/x', 'do': '10.9/other', 'title': '', 'ti': 'Y', 'year': 0, 'py': '2018'},
+        {'doi': np.nan, 'do': np.nan, 'title': np.nan, 'ti': 'The Alias', 'year': np.nan, 'py': np.nan},
+        {'doi': None, 'do': '  ', 'title': np.nan, 'ti': np.nan, 'year': '', 'py': '2021'},
+    ])
+    
+    vectorized = list(generate_keys(df)) + list(generate_keys(df_aliases))
+    row_by_row = (
+        [generate_key(row) for _, row in df.iterrows()]
+        + [generate_key(row) for row in df_aliases.to_dict('records')]
+    )
+    
+    for key_v, key_r in zip(vectorized, row_by_row):
+        print(f"   {key_v!r} vs {key_r!r}")
+    
+    has_doi = [_has_doi(row) for row in df_aliases.to_dict('records')]
+    print(f"   DOI detection: {has_doi}")
+    
+    assert vectorized == row_by_row, "Vectorized keys differ from row-by-row keys"
+    assert row_by_row[5:7] == ['DOI:10.2/y', 'DOI:10.3/z']
+    assert row_by_row[8] == 'TY:alias_NOYEAR_5'
+    assert has_doi == [True, True, True, False, False]
+    print("✅ PASS: Vectorized keys match row-by-row keys")
+
+
+def test_greedy_assignment():
+    """Test that each row takes its best remaining column above the threshold."""
+    print("\n=== TEST 9: Greedy Assignment ===")
+    
+    scores = np.array([
+        [50, 92, 0],
+        [95, 91, 0],
+        [0, 97, 10],
+    ], dtype=np.uint8)
+    
+    idx_a, idx_b = greedy_assign(scores, 90)
+    pairs = list(zip(idx_a.tolist(), idx_b.tolist()))
+    print(f"   Pairs: {pairs}")
+    
+    # Row 2's best column was already taken by row 0 and its other score is too low
+    assert pairs == [(0, 1), (1, 0)], f"Expected [(0, 1), (1, 0)], got {pairs}"
+    print("✅ PASS: Greedy assignment picked the expected pairs")
+
+
+def test_fuzzy_skips_doi_pairs():
+    """Test that fuzzy matching never pairs two references with different DOIs."""
+    print("\n=== TEST 10: Fuzzy Matching With DOIs ===")
+    
+    df_a = pd.DataFrame([
+        {'title': 'Deep Learning for Protein Folding', 'year': '2021', 'doi': '10.1000/a'},
+        {'title': 'Graph Neural Networks in Chemistry', 'year': '2022', 'doi': '10.1000/b'},
+    ])
+    
+    df_b = pd.DataFrame([
+        {'title': 'Deep Learning for Protein Foldng', 'year': '2021', 'doi': '10.1000/other'},
+        {'title': 'Graph Neural Networks in Chemistry', 'year': '2022', 'doi': None},
+    ])
+    
+    overlap, unique_a, unique_b = compare_datasets(df_a, df_b, use_fuzzy=True)
+    
+    print(f"Overlap: {len(overlap)}")
+    print(f"Unique to A: {len(unique_a)}")
+    print(f"Unique to B: {len(unique_b)}")
+    
+    # Different DOIs stay apart; DOI vs. no DOI can still match on title
+    titles = overlap['title'].tolist()
+    assert titles == ['Graph Neural Networks in Chemistry'], f"Unexpected overlap {titles}"
+    assert len(unique_a) == 1 and len(unique_b) == 1
+    print("✅ PASS: Only the DOI/no-DOI pair was fuzzy matched")
+
+
+def test_fuzzy_requires_known_year():
+    """Test that fuzzy matching does not pair references that both lack a year."""
+    print("\n=== TEST 11: Fuzzy Matching Without Years ===")
+    
+    df_a = pd.DataFrame([
+        {'title': 'Machine Learning in Healthcare', 'year': None},
+        {'title': 'Deep Learning Applications', 'year': '2023'},
+    ])
+    
+    df_b = pd.DataFrame([
+        {'title': 'Machine Learing in Healthcare', 'year': None},  # Typo, no year
+        {'title': 'Deep Learing Applications', 'year': '2023'},  # Typo, same year
+    ])
+    
+    overlap, unique_a, unique_b = compare_datasets(df_a, df_b, use_fuzzy=True)
+    
+    print(f"Overlap: {len(overlap)}")
+    print(f"Unique to A: {len(unique_a)}")
+    print(f"Unique to B: {len(unique_b)}")
+    
+    titles = overlap['title'].tolist()
+    assert titles == ['Deep Learning Applications'], f"Unexpected overlap {titles}"
+    print("✅ PASS: Only the pair with a known year was fuzzy matched")
+
+
+def test_fuzzy_recall_with_leading_typo():
+    """Test that a typo changing the metaphone block still fuzzy matches."""
+    print("\n=== TEST 12: Fuzzy Matching With A Typo In The First Word ===")
+    
+    df_a = pd.DataFrame([
+        {'title': 'Clinical Transformer Models for Triage', 'year': '2022'},
+        {'title': 'Clinical Trials of Protein Folding Models', 'year': '2022'},
+        {'title': 'Graph Neural Networks in Chemistry', 'year': '2022'},
+    ])
+    
+    # Typos near the start change the metaphone prefix ("Xtransformer",
+    # "Grahp"), while the first title's own prefix block still exists in B
+    # (the other "Clinical ..." titles) without holding its match
+    df_b = pd.DataFrame([
+        {'title': 'Clinical Xtransformer Models for Triage', 'year': '2022'},
+        {'title': 'Klinical Trials of Protein Folding Models', 'year': '2022'},
+        {'title': 'Grahp Neural Networks in Chemistry', 'year': '2022'},
+        {'title': 'Clinical Transcriptomics Atlas', 'year': '2022'},
+    ])
+    
+    overlap, unique_a, unique_b = compare_datasets(df_a, df_b, use_fuzzy=True)
+    
+    print(f"Overlap: {len(overlap)}")
+    print(f"Unique to A: {len(unique_a)}")
+    print(f"Unique to B: {len(unique_b)}")
+    
+    assert len(overlap) == 3 and overlap['fuzzy_match'].all(), f"Unexpected overlap {overlap['title'].tolist()}"
+    assert unique_b['title'].tolist() == ['Clinical Transcriptomics Atlas']
+    print("✅ PASS: Every typo pair was fuzzy matched")
+
+
+def _run(test):
+    """Run one test for run_all_tests: True unless it fails an assert or returns False."""
+    try:
+        return test() is not False
+    except AssertionError as e:
+        print(f"❌ FAIL: {e}")
+        return False
+
+
 def run_all_tests():
     """Run all tests and report results."""
     print("=" * 70)
@@ -308,6 +463,11 @@ def run_all_tests():
         "Match Confidence": test_match_confidence(),
         "Real Sample Data": test_real_sample_data(),
         "Edge Cases": test_edge_cases(),
+        "Vectorized Key Generation": _run(test_vectorized_key_generation),
+        "Greedy Assignment": _run(test_greedy_assignment),
+        "Fuzzy Matching With DOIs": _run(test_fuzzy_skips_doi_pairs),
+        "Fuzzy Matching Without Years": _run(test_fuzzy_requires_known_year),
+        "Fuzzy Matching With A Typo In The First Word": _run(test_fuzzy_recall_with_leading_typo),
     }
     
     print("\n" + "=" * 70)
@@ -33,10 +33,10 @@ def test_logic():
     print(f"Unique A: {len(unique_a)} (Expected 1: 'Ancient History')")
     print(f"Unique B: {len(unique_b)} (Expected 1: 'Quantum Computing')")
     
-    for item in overlap:
+    for item in overlap.to_dict('records'):
         print(f"  Overlap Item: {item.get('title') or item.get('ti')}")
         
-    for item in unique_a:
+    for item in unique_a.to_dict('records'):
         print(f"  Unique A Item: {item.get('title') or item.get('ti')}")
         print(f"  Type: {item.get('type_of_reference', 'UNK')} (Expected 'BOOK')")
 
@@ -40,7 +40,7 @@ matched, unmatched, stats = search_references(test_df, query, fields)
 print(f"Total matched: {stats['matched_count']}")
 print("=" * 70)
 
-for i, ref in enumerate(matched, 1):
+for i, (_, ref) in enumerate(matched.iterrows(), 1):
     print(f"\n{i}. {ref['title']}")
     print(f"   Match count: {ref.get('match_count', 0)}")
     print(f"   Matched terms:")
@@ -0,0 +1,103 @@
+"""
+Tests for the literal scanner, checked against Python's `needle in text`
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import search_engine
+from src.scanner import find_literals, pack_texts, scan_literals
+
+
+def expected(texts, needles):
+    return np.array([[needle in text for needle in needles] for text in texts],
+                    dtype=bool).reshape(len(texts), len(needles))
+
+
+@pytest.mark.parametrize("texts, needles", [
+    # 1-byte needles, including the first and last byte of a text
+    ([b'abc', b'xyz', b'a', b''], [b'a', b'c', b'z', b'q']),
+    # Needles longer than the text
+    ([b'ab', b'abc', b'abcd'], [b'abcd', b'abcde', b'bcd']),
+    # Needle at the very end of the text (and nowhere else)
+    ([b'the quick brown fox', b'fox the', b'fo'], [b'fox', b'the', b'x']),
+    # Repeated prefixes that trip up a naive shift
+    ([b'aaaab', b'abaabaab', b'aab'], [b'aab', b'baab', b'aaaa']),
+    # Multi-byte UTF-8: needles only match on the exact byte sequence
+    (['données ščř 日本語'.encode('utf-8'), 'naïve'.encode('utf-8'), b'e'],
+     ['é'.encode('utf-8'), '日本'.encode('utf-8'), '語'.encode('utf-8'), b'na', b'e']),
+])
+def test_find_literals_matches_in(texts, needles):
+    assert (find_literals(texts, needles) == expected(texts, needles)).all()
+
+
+def test_find_literals_empty_texts():
+    needles = [b'a', b'abc']
+
+    # All-empty column: nothing is found, and the shape is still (n_texts, n_needles)
+    found = find_literals([b'', b'', b''], needles)
+    assert found.shape == (3, 2)
+    assert not found.any()
+
+    # Empty texts around non-empty ones don't shift the offsets
+    texts = [b'', b'abc', b'', b'xa', b'']
+    assert (find_literals(texts, needles) == expected(texts, needles)).all()
+
+    assert find_literals([], needles).shape == (0, 2)
+    assert find_literals([b'abc'], []).shape == (1, 0)
+
+
+def test_scan_literals_random():
+    rng = np.random.default_rng(0)
+    # Small alphabet so that partial matches and hits are frequent
+    texts = [bytes(rng.choice(list(b'abc'), size=rng.integers(0, 40)).tolist()) for _ in range(200)]
+    needles = [bytes(rng.choice(list(b'abc'), size=rng.integers(1, 6)).tolist()) for _ in range(30)]
+
+    chars, offsets = pack_texts(texts)
+    needle_chars, needle_offsets = pack_texts(needles)
+    found = np.zeros((len(texts), len(needles)), dtype=np.bool_)
+    scan_literals(chars, offsets, needle_chars, needle_offsets, found)
+
+    assert (found == expected(texts, needles)).all()
+
+
+@pytest.fixture
+def hyperscan_always(monkeypatch):
+    if search_engine.hyperscan is None:
+        pytest.skip("hyperscan is not installed")
+    monkeypatch.setattr(search_engine, 'HYPERSCAN_MIN_NEEDLES', 1)
+    search_engine.compile_query.cache_clear()
+    yield
+    search_engine.compile_query.cache_clear()
+
+
+def test_hyperscan_needles_match_numba(hyperscan_always):
+    query = 'ab OR "é" OR 日本 OR fox OR abcdef'
+    compiled = search_engine.compile_query(query, ('title',))
+    assert compiled.database is not None
+
+    texts = [b'', b'ab', b'a fox', b'abcde', 'déjà'.encode('utf-8'),
+             '日本語'.encode('utf-8'), b'xx abcdef']
+    assert (compiled.find_needles(texts) == find_literals(texts, compiled.needles)).all()
+
+
+def test_hyperscan_search_matches_numba(hyperscan_always, monkeypatch):
+    df = pd.DataFrame([
+        {'title': 'Données de santé', 'abstract': None},
+        {'title': 'The quick brown fox', 'abstract': 'jumps over'},
+        {'title': '', 'abstract': 'A Fox at the end: fox'},
+        {'title': 'Nothing', 'abstract': 'here'},
+    ])
+    query = '(fox OR santé OR "brown fox") AND (the OR données OR end)'
+    fields = ['title', 'abstract']
+
+    matched, unmatched, stats = search_engine._search_references(df, query, fields)
+    assert search_engine.compile_query(query, tuple(fields)).database is not None
+    monkeypatch.setattr(search_engine, 'HYPERSCAN_MIN_NEEDLES', 10 ** 9)
+    search_engine.compile_query.cache_clear()
+    expected_matched, expected_unmatched, _ = search_engine._search_references(df, query, fields)
+
+    assert stats['error'] is None
+    assert matched['title'].tolist() == ['Données de santé', 'The quick brown fox', '']
+    pd.testing.assert_frame_equal(matched, expected_matched)
+    pd.testing.assert_frame_equal(unmatched, expected_unmatched)
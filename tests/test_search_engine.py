@@ -0,0 +1,111 @@
+"""
+Tests for the search engine: long queries and result caching
+"""
+import pandas as pd
+import pytest
+
+from src import search_engine
+from src.search_engine import search_references
+
+
+@pytest.fixture(scope="module")
+def test_df():
+    return pd.DataFrame([
+        {'title': 'ChatGPT for Risk Assessment', 'abstract': 'Synonym 199 appears here.'},
+        {'title': 'Unrelated Work', 'abstract': 'Nothing to see.'},
+        {'title': 'Another Unrelated Work', 'abstract': 'Synonym 3 only.'},
+    ])
+
+
+@pytest.mark.parametrize("n_terms", [250, 600, 2000])
+def test_long_or_list(test_df, n_terms):
+    # Systematic-review queries often OR together hundreds of synonyms
+    query = ' OR '.join(f'"synonym {i}"' for i in range(n_terms))
+    matched, unmatched, stats = search_references(test_df, query, ['title', 'abstract'])
+
+    assert stats['error'] is None
+    assert matched['title'].tolist() == ['ChatGPT for Risk Assessment', 'Another Unrelated Work']
+
+
+def test_long_or_lists_combined_with_and(test_df):
+    synonyms = ' OR '.join(f'"synonym {i}"' for i in range(300))
+    topics = ' OR '.join(['ChatGPT'] + [f'topic{i}' for i in range(300)])
+    matched, unmatched, stats = search_references(
+        test_df, f'({synonyms}) AND ({topics})', ['title', 'abstract']
+    )
+
+    assert stats['error'] is None
+    assert matched['title'].tolist() == ['ChatGPT for Risk Assessment']
+
+
+@pytest.fixture
+def counted_searches(monkeypatch, tmp_path):
+    """Fresh caches (disk store under tmp_path) and a count of uncached searches."""
+    monkeypatch.setattr(search_engine, '_RESULT_CACHE', search_engine._ResultCache())
+    monkeypatch.setattr(search_engine, '_DISK_CACHE', search_engine._DiskCache(str(tmp_path / 'cache')))
+
+    calls = []
+    uncached = search_engine._search_references
+
+    def counting(*args, **kwargs):
+        calls.append(args)
+        return uncached(*args, **kwargs)
+
+    monkeypatch.setattr(search_engine, '_search_references', counting)
+    return calls
+
+
+def test_frame_fingerprint(test_df):
+    fingerprint = search_engine._frame_fingerprint(test_df)
+    assert search_engine._frame_fingerprint(test_df.copy()) == fingerprint
+
+    changed_cell = test_df.copy()
+    changed_cell.loc[1, 'abstract'] = 'Nothing to see!'
+    assert search_engine._frame_fingerprint(changed_cell) != fingerprint
+
+    renamed = test_df.rename(columns={'abstract': 'ab'})
+    assert search_engine._frame_fingerprint(renamed) != fingerprint
+    assert search_engine._frame_fingerprint(test_df.assign(year=2024)) != fingerprint
+
+
+def test_result_cache_misses(test_df, counted_searches):
+    query, fields = '"synonym 3"', ['title', 'abstract']
+
+    first = search_references(test_df, query, fields)
+    assert search_references(test_df.copy(), query, fields) is first
+    assert len(counted_searches) == 1
+
+    # A changed cell, a changed column or another highlight_limit is a new search
+    changed_cell = test_df.copy()
+    changed_cell.loc[0, 'abstract'] = 'Synonym 3 appears here.'
+    matched, _, _ = search_references(changed_cell, query, fields)
+    assert matched['title'].tolist() == ['ChatGPT for Risk Assessment', 'Another Unrelated Work']
+    assert len(counted_searches) == 2
+
+    search_references(test_df.assign(year=2024), query, fields)
+    assert len(counted_searches) == 3
+
+    search_references(test_df, query, fields, highlight_limit=1)
+    assert len(counted_searches) == 4
+    search_references(test_df, query, fields, highlight_limit=1)
+    assert len(counted_searches) == 4
+
+
+def test_cache_clear(test_df, counted_searches, tmp_path):
+    query, fields = '"synonym 3"', ['title', 'abstract']
+
+    search_references(test_df, query, fields)
+    assert len(counted_searches) == 1
+
+    # A result dropped from memory is still on disk
+    search_engine._RESULT_CACHE.clear()
+    search_references(test_df, query, fields)
+    assert len(counted_searches) == 1
+    assert list((tmp_path / 'cache').rglob('output.pkl'))
+
+    search_references.cache_clear()
+    assert not search_engine._RESULT_CACHE._entries
+    assert not list((tmp_path / 'cache').rglob('output.pkl'))
+
+    search_references(test_df, query, fields)
+    assert len(counted_searches) == 2
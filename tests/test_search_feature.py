@@ -90,7 +90,7 @@ else:
 print(f"\n{'='*60}")
 print(f"MATCHED REFERENCES:")
 print(f"{'='*60}")
-for i, ref in enumerate(matched, 1):
+for i, (_, ref) in enumerate(matched.iterrows(), 1):
     print(f"\n{i}. {ref['title']}")
     print(f"   Year: {ref['year']}")
     print(f"   Matched terms: {ref.get('matched_terms', [])}")
@@ -100,7 +100,7 @@ for i, ref in enumerate(matched, 1):
 print(f"\n{'='*60}")
 print(f"UNMATCHED REFERENCES:")
 print(f"{'='*60}")
-for i, ref in enumerate(unmatched, 1):
+for i, (_, ref) in enumerate(unmatched.iterrows(), 1):
     print(f"{i}. {ref['title']} ({ref['year']})")
 
 # Test 3: Wildcard matching
@@ -113,7 +113,7 @@ matched_wc, _, stats_wc = search_references(test_data, wildcard_query, ['title',
 
 print(f"Query: {wildcard_query}")
 print(f"Matched: {stats_wc['matched_count']}")
-for ref in matched_wc:
+for _, ref in matched_wc.iterrows():
     print(f"  - {ref['title']}")
     print(f"    Matched: {ref.get('matched_terms', [])}")
 